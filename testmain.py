@@ -6,15 +6,26 @@
 # and machine learning to create adaptive systems.
 # main.py
 
+import os
+import re
+import math
+import array
 import time
 import struct
 import json
 import sys
 import argparse
+import tempfile
 import threading
+from concurrent.futures import ProcessPoolExecutor
 from abc import ABC, abstractmethod
 from dataclasses import dataclass, field, asdict
-from typing import Callable, Dict, Any, TypeVar, Generic, Union, Optional
+from typing import Callable, Dict, Any, TypeVar, Generic, Union, Optional, Iterator, List, Set, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # buffer payloads still round-trip as memoryviews without numpy
+    np = None
 
 T = TypeVar('T')
 
@@ -43,28 +54,46 @@ class ScratchArena:
         self.chunk_size = chunk_size
         self.head = Node(chunk_size)
         self.current = self.head
+        self.oversized: List[Node] = []  # dedicated chunks handed out since the last reset
+        self.spare: Optional[Node] = None  # largest oversized chunk, kept across resets
 
-    def allocate(self, size: int) -> memoryview:
+    def allocate(self, size: int, align: int = 1) -> memoryview:
+        # Oversized requests get a dedicated chunk, reusing the spare one when it is big
+        # enough so repeated large payloads don't reallocate and zero-fill every time.
         if size > self.chunk_size:
-            raise ValueError("Allocation size exceeds chunk size")
+            if self.spare is not None and self.spare.size >= size:
+                node, self.spare = self.spare, None
+            else:
+                node = Node(size)
+            node.used = size
+            self.oversized.append(node)
+            return memoryview(node.data)[:size]
+
+        # Round the start up to `align`; chunk buffers themselves start malloc-aligned
+        start = -(-self.current.used // align) * align
 
         # If there's not enough space in the current chunk, create a new one
-        if self.current.used + size > self.current.size:
+        if start + size > self.current.size:
             new_node = Node(self.chunk_size)
             self.current.next = new_node
             self.current = new_node
+            start = 0
 
         # Allocate memory from the current chunk
-        start = self.current.used
-        self.current.used += size
+        self.current.used = start + size
         return memoryview(self.current.data)[start:start + size]
 
     def reset(self):
-        # Reset all chunks for reuse
+        # Reset all chunks for reuse; of the oversized chunks only the largest is kept
         node = self.head
         while node:
             node.used = 0
             node = node.next
+        if self.oversized:
+            if self.spare is not None:
+                self.oversized.append(self.spare)
+            self.spare = max(self.oversized, key=lambda n: n.size)
+            self.oversized = []
         self.current = self.head
 
 
@@ -191,6 +220,22 @@ def decode_callable(value: int) -> Callable:
     return reverse_lookup[value]
 
 
+# dict payloads carry their own magic so decode() can tell a json object from a str payload.
+DICT_MAGIC = b'\xa7DCT'
+
+# Buffer payloads (numpy arrays and anything exposing the buffer protocol) are framed as
+# header | format | shape | padding | raw bytes, so the payload is never converted or
+# re-encoded and decode() can hand back a view over the source buffer.
+# A str payload would only be mistaken for this if its length prefix spelled BUFFER_MAGIC (~2.8 GB).
+BUFFER_MAGIC = b'\xa7BUF'
+BUFFER_HEADER = struct.Struct('!4sBBHI')  # magic, kind | byte order, ndim, format length, itemsize
+BUFFER_ALIGN = 16
+BUFFER_KIND_NDARRAY = 1
+BUFFER_KIND_MEMORYVIEW = 2
+BUFFER_BIG_ENDIAN = 0x80  # set in the kind byte when the encoding host is big-endian
+MEMORYVIEW_FORMATS = frozenset('cbB?hHiIlLqQnNfd')  # formats memoryview.cast() accepts
+
+
 @dataclass
 class AtomicData(Atom):
     data: Any
@@ -207,11 +252,104 @@ class AtomicData(Atom):
             return struct.pack(f'!I{len(data_bytes)}s', len(data_bytes), data_bytes)
         elif isinstance(self.data, dict):
             data_bytes = json.dumps(self.data).encode('utf-8')
-            return struct.pack(f'!I{len(data_bytes)}s', len(data_bytes), data_bytes)
+            return struct.pack(f'!4sI{len(data_bytes)}s', DICT_MAGIC, len(data_bytes), data_bytes)
         else:
-            raise ValueError("Unsupported data type for struct serialization")
+            header, payload = self.buffer_parts()
+            return b''.join((header, payload))
+
+    def buffer_parts(self) -> Tuple[bytes, memoryview]:
+        # Header plus a byte view of the payload; the payload is only copied when the
+        # source is non-contiguous or in a format memoryview cannot reinterpret.
+        data, view = self.data, None
+        if np is not None and isinstance(data, np.generic):
+            data = np.asarray(data)  # numpy scalars travel as 0-d arrays
+        if np is None or not isinstance(data, np.ndarray):
+            try:
+                view = memoryview(data)
+            except TypeError:
+                raise ValueError("Unsupported data type for struct serialization") from None
+            if view.format.lstrip('@') not in MEMORYVIEW_FORMATS:
+                # Explicit byte order or standard sizes ('<d' from ctypes, '=i') and half floats ('e')
+                # can't be rebuilt by memoryview.cast(); numpy reads them as typed arrays instead.
+                if np is None:
+                    raise ValueError(f"Buffer format {view.format!r} needs numpy for serialization")
+                try:
+                    data, view = np.asarray(view), None
+                except (TypeError, ValueError, NotImplementedError):
+                    raise ValueError(f"Unsupported buffer format for serialization: {view.format!r}") from None
+
+        if view is None:
+            if data.dtype.hasobject or data.dtype.fields is not None:
+                raise ValueError(f"Unsupported dtype for buffer serialization: {data.dtype}")
+            kind, fmt, shape, itemsize = BUFFER_KIND_NDARRAY, data.dtype.str, data.shape, data.dtype.itemsize
+            payload = memoryview(np.ascontiguousarray(data).reshape(-1).view(np.uint8))
+        else:
+            kind, fmt, shape, itemsize = BUFFER_KIND_MEMORYVIEW, view.format.lstrip('@'), view.shape, view.itemsize
+            if not view.c_contiguous:
+                payload = memoryview(view.tobytes())
+            else:
+                payload = view.cast('B') if view.ndim else memoryview(view.tobytes())
+
+        fmt_bytes = fmt.encode('ascii')
+        if sys.byteorder == 'big':
+            kind |= BUFFER_BIG_ENDIAN
+        header = BUFFER_HEADER.pack(BUFFER_MAGIC, kind, len(shape), len(fmt_bytes), itemsize)
+        header += fmt_bytes + struct.pack(f'!{len(shape)}Q', *shape)
+        header += bytes(-len(header) % BUFFER_ALIGN)
+        return header, payload
+
+    def encode_to_arena(self) -> memoryview:
+        # Serializes straight into a slice of scratch_arena, so a buffer payload is copied
+        # exactly once and decode() can view the slice in place.
+        if isinstance(self.data, (int, float, str, dict)):
+            header, payload = self.encode(), memoryview(b'')
+        else:
+            header, payload = self.buffer_parts()
+        view = self.scratch_arena.allocate(len(header) + payload.nbytes, align=BUFFER_ALIGN)
+        view[:len(header)] = header
+        view[len(header):] = payload
+        return view
+
+    @staticmethod
+    def decode_buffer(data: Union[bytes, bytearray, memoryview]) -> Any:
+        # Returns an ndarray or memoryview over `data` itself; nothing is copied.
+        view = memoryview(data)
+        if view.format != 'B' or view.ndim != 1:
+            view = view.cast('B')
+        _, kind, ndim, fmt_len, itemsize = BUFFER_HEADER.unpack_from(view)
+        offset = BUFFER_HEADER.size
+        fmt = bytes(view[offset:offset + fmt_len]).decode('ascii')
+        offset += fmt_len
+        shape = struct.unpack_from(f'!{ndim}Q', view, offset)
+        offset += 8 * ndim
+        offset += -offset % BUFFER_ALIGN
+        count = math.prod(shape)
+
+        big_endian, kind = bool(kind & BUFFER_BIG_ENDIAN), kind & ~BUFFER_BIG_ENDIAN
+        if kind == BUFFER_KIND_NDARRAY:
+            # dtype strings carry their own byte order, so these decode on any host.
+            if np is None:
+                raise ValueError("numpy is required to decode ndarray payloads")
+            return np.frombuffer(view, dtype=np.dtype(fmt), count=count, offset=offset).reshape(shape)
+        if kind != BUFFER_KIND_MEMORYVIEW:
+            raise ValueError(f"Unknown buffer payload kind: {kind}")
+        if itemsize > 1 and big_endian != (sys.byteorder == 'big'):
+            raise ValueError("Buffer payload was encoded with a different byte order than this host")
+        if struct.calcsize(fmt) != itemsize:
+            raise ValueError(f"Buffer format {fmt!r} has a different item size on this platform")
+        payload = view[offset:offset + count * itemsize]
+        if count == 0:
+            return payload.cast(fmt)  # memoryview cannot cast to a shape containing zeros
+        return payload.cast(fmt, shape)
 
     def decode(self, data: bytes) -> None:
+        if len(data) >= BUFFER_HEADER.size and data[:4] == BUFFER_MAGIC:
+            self.data = self.decode_buffer(data)
+            return
+        if len(data) >= 8 and data[:4] == DICT_MAGIC:
+            data_len = struct.unpack('!I', data[4:8])[0]
+            self.data = json.loads(bytes(data[8:8 + data_len]))
+            return
         try:
             self.data = struct.unpack('!i', data)[0]
         except struct.error:
@@ -332,7 +470,303 @@ class FormalTheory(Atom, Generic[T]):
         return expression()
 
 
-def benchmark():
+# Obsidian vault indexing: frontmatter, [[wikilinks]] and #tags per note, kept in step
+# with an mtime/size manifest so a re-scan only re-parses the notes that changed.
+VAULT_INDEX_VERSION = 1
+VAULT_PARALLEL_THRESHOLD = 64  # below this many changed notes a process pool costs more than it saves
+FRONTMATTER_RE = re.compile(r'\A---[ \t]*\r?\n(.*?)\r?\n---[ \t]*(?:\r?\n|\Z)', re.DOTALL)
+FENCE_RE = re.compile(r'^(```|~~~).*?^\1', re.DOTALL | re.MULTILINE)
+INLINE_CODE_RE = re.compile(r'`[^`\n]*`')
+WIKILINK_RE = re.compile(r'!?\[\[([^\[\]|#^\n]*)[^\[\]\n]*\]\]')
+TAG_RE = re.compile(r'(?<![\w/#&])#([\w/-]*[^\W\d][\w/-]*)')
+
+
+def _frontmatter_scalar(value: str) -> str:
+    value = value.strip()
+    if len(value) >= 2 and value[0] == value[-1] and value[0] in '"\'':
+        return value[1:-1]
+    return value
+
+
+def parse_frontmatter(block: str) -> Dict[str, Any]:
+    # Flat YAML subset: `key: value`, `key: [a, b]` and `key:` followed by `- item` lines.
+    # Values are kept as strings so the result round-trips through json unchanged.
+    meta: Dict[str, Any] = {}
+    key = None
+    for line in block.splitlines():
+        stripped = line.strip()
+        if not stripped or stripped.startswith('#'):
+            continue
+        if stripped == '-' or stripped.startswith('- '):
+            item = _frontmatter_scalar(stripped[1:])
+            if item and key is not None and (meta[key] is None or isinstance(meta[key], list)):
+                meta[key] = (meta[key] or []) + [item]
+            continue
+        name, sep, value = line.partition(':')
+        if not sep or line[:1].isspace():
+            continue
+        key = name.strip()
+        value = value.strip()
+        if value.startswith('[') and value.endswith(']'):
+            meta[key] = [_frontmatter_scalar(v) for v in value[1:-1].split(',') if v.strip()]
+        else:
+            meta[key] = _frontmatter_scalar(value) if value else None
+    return meta
+
+
+def parse_note(path: str) -> Optional[Dict[str, Any]]:
+    # Module-level so it can be shipped to ProcessPoolExecutor workers. Returns None for a
+    # note that vanished or became unreadable since the walk, so one file can't abort a scan.
+    try:
+        with open(path, encoding='utf-8', errors='replace') as f:
+            text = f.read()
+    except OSError:
+        return None
+    frontmatter: Dict[str, Any] = {}
+    match = FRONTMATTER_RE.match(text)
+    if match:
+        frontmatter = parse_frontmatter(match.group(1))
+        text = text[match.end():]
+    body = INLINE_CODE_RE.sub('', FENCE_RE.sub('', text))
+    links = dict.fromkeys(t.strip() for t in WIKILINK_RE.findall(body) if t.strip())
+    # [[#Heading]] and [[note|#alias]] are links, not tags
+    tags = dict.fromkeys(TAG_RE.findall(WIKILINK_RE.sub(' ', body)))
+    declared = frontmatter.get('tags', frontmatter.get('tag')) or []
+    if isinstance(declared, str):
+        declared = declared.replace(',', ' ').split()
+    for tag in declared:
+        tags.setdefault(tag.lstrip('#'))
+    return {'frontmatter': frontmatter, 'links': list(links), 'tags': list(tags)}
+
+
+def note_key(name: str) -> str:
+    # Obsidian resolves [[Note]], [[folder/Note]] and [[Note.md]] to the same note, case-insensitively.
+    name = name.replace('\\', '/').rsplit('/', 1)[-1]
+    if name.lower().endswith('.md'):
+        name = name[:-3]
+    return name.casefold()
+
+
+class VaultIndex:
+    def __init__(self, root: str, index_path: Optional[str] = None, workers: Optional[int] = None):
+        self.root = os.path.abspath(root)
+        self.index_path = os.path.abspath(index_path or os.path.join(self.root, '.lager', 'index.json'))
+        self.workers = workers
+        self.scratch_arena = ScratchArena(1024)  # shared by every atom the index hands out
+        self.manifest: Dict[str, List[int]] = {}
+        self.notes: Dict[str, Dict[str, Any]] = {}
+        self.backlink_index: Dict[str, Set[str]] = {}
+        self.tag_index: Dict[str, Set[str]] = {}
+        self.load()
+
+    def load(self) -> bool:
+        try:
+            with open(self.index_path, encoding='utf-8') as f:
+                state = json.load(f)
+            if state.get('version') != VAULT_INDEX_VERSION:
+                return False
+            manifest, notes = dict(state['manifest']), dict(state['notes'])
+            backlink_index = {k: set(v) for k, v in state['backlinks'].items()}
+            tag_index = {k: set(v) for k, v in state['tags'].items()}
+        except (OSError, ValueError, KeyError, TypeError, AttributeError):
+            # Missing, corrupt or foreign index files all fall back to a cold index.
+            return False
+        if manifest.keys() != notes.keys() or not all(map(self._valid_note, notes.values())):
+            return False
+        self.manifest, self.notes = manifest, notes
+        self.backlink_index, self.tag_index = backlink_index, tag_index
+        return True
+
+    @staticmethod
+    def _valid_note(note: Any) -> bool:
+        return isinstance(note, dict) and all(
+            isinstance(note.get(key), list) and all(isinstance(item, str) for item in note[key])
+            for key in ('links', 'tags'))
+
+    def save(self) -> None:
+        state = {
+            'version': VAULT_INDEX_VERSION,
+            'manifest': self.manifest,
+            'notes': self.notes,
+            'backlinks': {k: sorted(v) for k, v in self.backlink_index.items()},
+            'tags': {k: sorted(v) for k, v in self.tag_index.items()},
+        }
+        os.makedirs(os.path.dirname(self.index_path), exist_ok=True)
+        tmp_path = f"{self.index_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(state, f, separators=(',', ':'))
+        os.replace(tmp_path, self.index_path)
+
+    def walk(self) -> Iterator[Tuple[str, os.stat_result]]:
+        # Yields vault-relative, '/'-separated paths; dot-directories (.obsidian, .lager, .git) are skipped.
+        # Subdirectories and notes that disappear mid-walk are skipped; a missing root still raises.
+        stack = ['']
+        while stack:
+            rel_dir = stack.pop()
+            try:
+                entries = os.scandir(os.path.join(self.root, rel_dir))
+            except OSError:
+                if not rel_dir:
+                    raise
+                continue
+            with entries:
+                for entry in entries:
+                    if entry.name.startswith('.'):
+                        continue
+                    rel = f"{rel_dir}/{entry.name}" if rel_dir else entry.name
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            stack.append(rel)
+                        elif entry.name.endswith('.md') and entry.is_file():
+                            yield rel, entry.stat()
+                    except OSError:
+                        continue
+
+    def scan(self) -> List[AtomicData]:
+        """
+        Brings the index up to date with the vault and returns atoms for the notes that
+        were added or modified; unchanged notes are never opened.
+        """
+        seen = {rel: [st.st_mtime_ns, st.st_size] for rel, st in self.walk()}
+        for rel in [rel for rel in self.manifest if rel not in seen]:
+            self._unindex(rel)
+            del self.manifest[rel]
+            self.notes.pop(rel, None)
+
+        changed = [rel for rel, signature in seen.items() if self.manifest.get(rel) != signature]
+        paths = [os.path.join(self.root, rel) for rel in changed]
+        if len(paths) < VAULT_PARALLEL_THRESHOLD or self.workers == 1:
+            parsed = list(map(parse_note, paths))
+        else:
+            with ProcessPoolExecutor(max_workers=self.workers) as executor:
+                parsed = list(executor.map(parse_note, paths, chunksize=256))
+
+        atoms = []
+        for rel, note in zip(changed, parsed):
+            self._unindex(rel)
+            if note is None:
+                # Left out of the manifest so the next scan retries it.
+                self.notes.pop(rel, None)
+                self.manifest.pop(rel, None)
+                continue
+            self.notes[rel] = note
+            self.manifest[rel] = seen[rel]
+            self._index(rel)
+            atoms.append(self.atom(rel))
+        return atoms
+
+    def _index(self, rel: str) -> None:
+        note = self.notes[rel]
+        for link in note['links']:
+            self.backlink_index.setdefault(note_key(link), set()).add(rel)
+        for tag in note['tags']:
+            self.tag_index.setdefault(tag.casefold(), set()).add(rel)
+
+    def _unindex(self, rel: str) -> None:
+        note = self.notes.get(rel)
+        if note is None:
+            return
+        for index, keys in ((self.backlink_index, map(note_key, note['links'])),
+                            (self.tag_index, (tag.casefold() for tag in note['tags']))):
+            for key in keys:
+                sources = index.get(key)
+                if sources is not None:
+                    sources.discard(rel)
+                    if not sources:
+                        del index[key]
+
+    def atom(self, rel: str) -> AtomicData:
+        return AtomicData(data={'path': rel, **self.notes[rel]}, scratch_arena=self.scratch_arena)
+
+    def backlinks(self, note: str) -> List[str]:
+        return sorted(self.backlink_index.get(note_key(note), ()))
+
+    def tagged(self, tag: str) -> List[str]:
+        return sorted(self.tag_index.get(tag.lstrip('#').casefold(), ()))
+
+
+def generate_vault(root: str, note_count: int, folders: int = 100) -> None:
+    for folder in range(folders):
+        os.makedirs(os.path.join(root, f"folder{folder}"), exist_ok=True)
+    for i in range(note_count):
+        with open(os.path.join(root, f"folder{i % folders}", f"note{i}.md"), 'w', encoding='utf-8') as f:
+            f.write(
+                f"---\ntitle: Note {i}\ntags: [bench, group{i % 100}]\n---\n"
+                f"# Note {i}\n"
+                f"Links to [[note{(i + 1) % note_count}]] and [[note{(i * 7) % note_count}|alias]]. #topic{i % 50}\n"
+            )
+
+
+def benchmark_vault(note_count: int = 100_000):
+    print(f"Benchmarking VaultIndex ({note_count} notes)...")
+    with tempfile.TemporaryDirectory() as root:
+        start_time = time.time()
+        generate_vault(root, note_count)
+        print(f"VaultIndex generate: {time.time() - start_time} seconds.")
+
+        index = VaultIndex(root)
+        start_time = time.time()
+        parsed = len(index.scan())
+        print(f"VaultIndex cold scan: {time.time() - start_time} seconds ({parsed} notes parsed).")
+
+        start_time = time.time()
+        index.save()
+        print(f"VaultIndex save: {time.time() - start_time} seconds.")
+
+        start_time = time.time()
+        parsed = len(index.scan())
+        print(f"VaultIndex warm rescan: {time.time() - start_time} seconds ({parsed} notes parsed).")
+
+        for i in range(0, note_count, max(1, note_count // 100)):
+            with open(os.path.join(root, f"folder{i % 100}", f"note{i}.md"), 'a', encoding='utf-8') as f:
+                f.write("Edited, see [[note0]]. #edited\n")
+        start_time = time.time()
+        parsed = len(index.scan())
+        print(f"VaultIndex incremental rescan: {time.time() - start_time} seconds ({parsed} notes parsed).")
+        index.save()
+
+        start_time = time.time()
+        reloaded = VaultIndex(root)
+        print(f"VaultIndex load: {time.time() - start_time} seconds.")
+
+        start_time = time.time()
+        for i in range(10000):
+            reloaded.backlinks(f"note{i % note_count}")
+        print(f"VaultIndex 10000 backlink queries: {time.time() - start_time} seconds.")
+
+        start_time = time.time()
+        for i in range(100):
+            reloaded.tagged(f"topic{i % 50}")
+        print(f"VaultIndex 100 tag queries: {time.time() - start_time} seconds.")
+
+
+def benchmark_buffers(megabytes=(1, 16), iterations: int = 100):
+    print("Benchmarking AtomicData buffer payloads...")
+    for size in megabytes:
+        count = size * 1024 * 1024 // 8
+        payloads = {
+            'array.array': array.array('d', range(count)),
+            'bytes': bytes(size * 1024 * 1024),
+        }
+        if np is not None:
+            payloads['ndarray'] = np.arange(count, dtype=np.float64).reshape(-1, 1024)
+        for name, payload in payloads.items():
+            data = AtomicData(data=payload)
+            start_time = time.time()
+            for _ in range(iterations):
+                data.data = payload
+                data.decode(data.encode())
+            print(f"AtomicData {name} {size} MB encode/decode: {(time.time() - start_time) / iterations} seconds per round trip.")
+
+            start_time = time.time()
+            for _ in range(iterations):
+                data.data = payload
+                data.decode(data.encode_to_arena())
+                data.scratch_arena.reset()
+            print(f"AtomicData {name} {size} MB arena encode/decode: {(time.time() - start_time) / iterations} seconds per round trip.")
+
+
+def benchmark(vault_notes: int = 0):
     # ScratchArena benchmark
     print("Benchmarking ScratchArena...")
     arena = ScratchArena(1024)
@@ -360,6 +794,12 @@ def benchmark():
         theory.decode(encoded)
     print(f"FormalTheory: {time.time() - start_time} seconds.")
 
+    benchmark_buffers()
+    if vault_notes:
+        benchmark_vault(vault_notes)
+
 
 if __name__ == "__main__":
-    benchmark()
\ No newline at end of file
+    parser.add_argument('--vault', type=int, nargs='?', const=100_000, default=0, metavar='NOTES',
+                        help="also benchmark VaultIndex on a generated vault (100000 notes if NOTES is omitted)")
+    benchmark(vault_notes=parser.parse_args().vault)
\ No newline at end of file
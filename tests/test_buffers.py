@@ -0,0 +1,85 @@
+import array
+import ctypes
+
+import numpy as np
+import pytest
+
+from testmain import BUFFER_ALIGN, BUFFER_BIG_ENDIAN, AtomicData, ScratchArena
+
+
+def round_trip(value, arena=False):
+    atom = AtomicData(data=value)
+    frame = atom.encode_to_arena() if arena else atom.encode()
+    decoded = AtomicData(data=None)
+    decoded.decode(frame)
+    return decoded.data, frame
+
+
+@pytest.mark.parametrize('arena', [False, True])
+@pytest.mark.parametrize('value', [
+    np.arange(12.0).reshape(3, 4),
+    np.arange(12, dtype='>i4').reshape(3, 4).T,
+    np.arange(6, dtype=np.float16),
+    np.array(5.0),
+    np.zeros((0, 3)),
+    np.array(['ab', 'c']),
+    np.arange(3).astype('M8[s]'),
+])
+def test_ndarray_round_trip_is_zero_copy(value, arena):
+    decoded, frame = round_trip(value, arena)
+    assert decoded.dtype == value.dtype and decoded.shape == value.shape
+    assert np.array_equal(decoded, value)
+    if value.size:
+        assert np.shares_memory(decoded, np.frombuffer(frame, np.uint8))
+
+
+def test_numpy_scalar_decodes_as_numpy():
+    decoded, _ = round_trip(np.float32(3.0))
+    assert isinstance(decoded, np.ndarray) and decoded.dtype == np.float32 and decoded == 3.0
+
+
+@pytest.mark.parametrize('value, fmt, shape', [
+    (array.array('d', [1.0, 2.0, 3.0]), 'd', (3,)),
+    (array.array('i'), 'i', (0,)),
+    (b'hello', 'B', (5,)),
+    (bytearray(b'xy'), 'B', (2,)),
+    (memoryview(b'abcdef').cast('c'), 'c', (6,)),
+    (memoryview(bytes(48)).cast('d', [2, 3]), 'd', (2, 3)),
+])
+def test_buffer_round_trip_is_a_view(value, fmt, shape):
+    decoded, frame = round_trip(value)
+    assert isinstance(decoded, memoryview)
+    assert decoded.format == fmt and decoded.shape == shape
+    assert decoded.tolist() == memoryview(value).tolist()
+    assert decoded.obj is frame
+
+
+def test_explicit_byte_order_formats_keep_dtype():
+    decoded, _ = round_trip((ctypes.c_double * 3)(1, 2, 3))
+    assert decoded.dtype == np.float64 and decoded.tolist() == [1.0, 2.0, 3.0]
+
+
+def test_byte_order_mismatch_raises():
+    frame = bytearray(AtomicData(data=array.array('d', [1.0])).encode())
+    frame[4] ^= BUFFER_BIG_ENDIAN
+    with pytest.raises(ValueError):
+        AtomicData(data=None).decode(bytes(frame))
+
+
+def test_unsupported_payloads_raise():
+    for value in (object(), np.array([None])):
+        with pytest.raises(ValueError):
+            AtomicData(data=value).encode()
+
+
+def test_arena_slices_are_aligned_and_reused():
+    arena = ScratchArena(1024)
+    arena.allocate(3)
+    atom = AtomicData(data=np.arange(4.0), scratch_arena=arena)
+    atom.decode(atom.encode_to_arena())
+    assert atom.data.flags.aligned and atom.data.ctypes.data % BUFFER_ALIGN == 0
+
+    big = AtomicData(data=np.arange(1 << 16, dtype=np.float64), scratch_arena=arena)
+    first = big.encode_to_arena().obj
+    arena.reset()
+    assert big.encode_to_arena().obj is first
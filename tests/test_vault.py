@@ -0,0 +1,76 @@
+import json
+
+from testmain import AtomicData, VaultIndex, parse_note
+
+
+def write(path, text):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(text, encoding='utf-8')
+
+
+def test_parse_note_links_tags_and_frontmatter(tmp_path):
+    note = tmp_path / 'A.md'
+    write(note, "---\ntitle: 'A'\ntags:\n  - x\n  - '#y'\n  -\n---\n"
+                "# Heading\nSee [[B#sec|bee]], [[#Heading]], [[x|#alias]] and ![[img.png]]. #foo #123 `#code`\n"
+                "```\n[[C]] #fenced\n```\n")
+    parsed = parse_note(str(note))
+    assert parsed['frontmatter'] == {'title': 'A', 'tags': ['x', '#y']}
+    assert parsed['links'] == ['B', 'x', 'img.png']
+    assert parsed['tags'] == ['foo', 'x', 'y']
+
+
+def test_parse_note_missing_file(tmp_path):
+    assert parse_note(str(tmp_path / 'gone.md')) is None
+
+
+def test_scan_add_edit_delete(tmp_path):
+    write(tmp_path / 'A.md', "#one")
+    write(tmp_path / 'sub' / 'B.md', "[[A]] #two")
+    write(tmp_path / '.obsidian' / 'C.md', "[[A]]")
+    index = VaultIndex(str(tmp_path))
+    assert sorted(atom.data['path'] for atom in index.scan()) == ['A.md', 'sub/B.md']
+    assert index.backlinks('a') == ['sub/B.md']
+    assert index.tagged('#TWO') == ['sub/B.md']
+    assert index.scan() == []
+
+    write(tmp_path / 'sub' / 'B.md', "[[Other]] #three, now longer")
+    assert [atom.data['path'] for atom in index.scan()] == ['sub/B.md']
+    assert index.backlinks('A') == [] and index.backlinks('other') == ['sub/B.md']
+    assert index.tagged('two') == [] and index.tagged('three') == ['sub/B.md']
+
+    (tmp_path / 'sub' / 'B.md').unlink()
+    assert index.scan() == []
+    assert set(index.manifest) == {'A.md'}
+    assert index.backlinks('other') == [] and index.tagged('three') == []
+
+
+def test_save_load_round_trip(tmp_path):
+    write(tmp_path / 'A.md', "[[B]] #tag")
+    index = VaultIndex(str(tmp_path))
+    index.scan()
+    index.save()
+    reloaded = VaultIndex(str(tmp_path))
+    assert reloaded.notes == index.notes and reloaded.manifest == index.manifest
+    assert reloaded.backlinks('B') == ['A.md'] and reloaded.tagged('tag') == ['A.md']
+    assert reloaded.scan() == []
+
+
+def test_inconsistent_index_loads_cold(tmp_path):
+    write(tmp_path / 'A.md', "[[B]]")
+    index_path = tmp_path / 'idx.json'
+    base = {'version': 1, 'manifest': {}, 'notes': {}, 'backlinks': {}, 'tags': {}}
+    for state in ({**base, 'manifest': {'Z.md': [1, 2]}},
+                  {**base, 'manifest': {'A.md': [1, 2]}, 'notes': {'A.md': {'links': 5, 'tags': []}}},
+                  {'version': 1, 'manifest': {}}):
+        index_path.write_text(json.dumps(state))
+        index = VaultIndex(str(tmp_path), index_path=str(index_path))
+        assert index.notes == {}
+        assert [atom.data['path'] for atom in index.scan()] == ['A.md']
+
+
+def test_atoms_round_trip_as_dicts(tmp_path):
+    write(tmp_path / 'A.md', "---\ntitle: A\n---\n[[B]] #tag")
+    atom = VaultIndex(str(tmp_path)).scan()[0]
+    decoded = AtomicData(data=None)
+    decoded.decode(atom.encode())
+    assert decoded.data == {'path': 'A.md', 'frontmatter': {'title': 'A'}, 'links': ['B'], 'tags': ['tag']}